@@ -0,0 +1,71 @@
+import re
+import unicodedata
+from typing import List, Set
+
+# ============================================================
+# 📞 Number Extraction
+# ============================================================
+# Kept free of Firebase/Playwright imports so process-pool workers can
+# import it without booting the whole backend.
+
+# Precompiled patterns, shared by every scraper.
+# One pass matches both bare 8-digit numbers and the 216 / +216 / 00216
+# forms, optionally grouped as "22 123 456", "22-123-456" or "22.123.456";
+# the group is the national part. Formats outside that (e.g. "(22) 123456"
+# or "2212 3456") are not recognized.
+# The lookarounds keep a grouped number from being cut out of a longer
+# digit run such as "22 123 456 789"; a contiguous 8-digit block (last
+# alternative) still matches even when other numbers sit next to it.
+# Separators are horizontal whitespace, "-" or "." only, so digits on
+# separate lines of one message are never fused into a number.
+_HSPACE = r"[^\S\n\r\v\f\x1c-\x1f\x85\u2028\u2029]"
+_SEP = rf"(?:[-.]|{_HSPACE})"
+_DIGITS8_RE = re.compile(
+    rf"(?:(?:\+|\b(?:00)?)216{_SEP}?|\b(?<!\d{_SEP}))"
+    rf"(\d{{2}}{_SEP}?\d{{3}}{_SEP}?\d{{3}})\b(?!{_SEP}?\d)"
+    r"|\b(\d{8})\b"
+)
+# First digits used by Tunisian mobile (2, 4, 5, 9) and fixed (3, 7) numbers
+_TN_LEADING_DIGITS = frozenset("234579")
+# Any decimal digit, in any script (same set the number pattern matches)
+_DIGIT_RE = re.compile(r"\d")
+# str.translate table that deletes every non-digit Latin-1 character
+_KEEP_DIGITS = str.maketrans("", "", "".join(chr(c) for c in range(256) if not chr(c).isdigit()))
+
+
+def may_contain_number(text: str) -> bool:
+    """Cheap pre-check: False when the text cannot hold 8 digits.
+
+    Most chat messages are greetings or emojis with no digits at all, so
+    counting digits rules them out before the full pattern runs.
+    """
+    return len(text) >= 8 and len(_DIGIT_RE.findall(text)) >= 8
+
+
+def extract_numbers(text: str) -> Set[str]:
+    """Extract valid Tunisian numbers.
+
+    Tunisian numbers are 8 digits whose first digit identifies the
+    operator or landline range, so a leading-digit check stands in for
+    full libphonenumber validation. It may accept numbers that are not
+    allocated yet, but it is far cheaper per chat message.
+    """
+    found = set()
+
+    for spaced, bare in _DIGITS8_RE.findall(text):
+        digits_only = (spaced or bare).translate(_KEEP_DIGITS)
+        if not digits_only.isascii():
+            # \d also matches other digit scripts (e.g. Arabic-Indic "٢٢١٢٣٤٥٦")
+            # and _HSPACE non-Latin-1 spaces; map to ASCII before validating.
+            digits_only = "".join(
+                str(unicodedata.decimal(c)) for c in digits_only if c.isdecimal()
+            )
+        if len(digits_only) == 8 and digits_only[0] in _TN_LEADING_DIGITS:
+            found.add(digits_only)
+
+    return found
+
+
+def extract_many(texts: List[str]) -> List[Set[str]]:
+    """Run extract_numbers over a batch of messages (one pool round-trip)."""
+    return [extract_numbers(text) for text in texts]
@@ -1,16 +1,25 @@
 import os
 import time
-import re
+import asyncio
 import threading
+import multiprocessing
 import json
-from typing import Dict, Set
+import orjson
+import queue
+import hashlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
-from playwright.sync_api import sync_playwright
-import phonenumbers
+from playwright.async_api import Browser, async_playwright
+from google.api_core.exceptions import Aborted, AlreadyExists, DeadlineExceeded
 import firebase_admin
 from firebase_admin import credentials, auth as firebase_auth, firestore
+from extraction import extract_many, may_contain_number
 
 # ============================================================
 # 🔥 Firebase Initialization
@@ -49,32 +58,160 @@ app.add_middleware(
 # 🌍 Globals
 # ============================================================
 
-sessions: Dict[str, Dict] = {}
+SESSION_HISTORY_MAX = 10000  # numbers replayed to a reconnecting /stream
+
+
+class FoundNumber(NamedTuple):
+    number: str
+    message: str
+
+
+class PendingWrite(NamedTuple):
+    uid: str
+    number: str
+    message: str
+    touch: bool  # also bump lastUpdated on the extraction doc
+
+
+@dataclass(slots=True)
+class SessionState:
+    running: bool = False
+    numbers: Deque[FoundNumber] = field(default_factory=lambda: deque(maxlen=SESSION_HISTORY_MAX))
+    error: Optional[str] = None
+    future: Optional[Future] = None
+
+    def is_active(self) -> bool:
+        """True from /start until the scraper job has finished, setup included."""
+        return self.future is not None and not self.future.done()
+
+
+sessions: Dict[str, SessionState] = {}
+# Live /stream connections per uid as (event loop, queue) pairs. Kept apart
+# from sessions so a stream survives /start replacing the session.
+subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+_subscribers_lock = threading.Lock()
 HEADLESS = os.environ.get("HEADLESS", "true").lower() == "true"
 BROWSER_PATH = os.environ.get("BROWSER_PATH")
 
+# Every scraper holds a browser context, so cap how many run at once
+MAX_SCRAPERS = int(os.getenv("MAX_SCRAPERS", "8"))
+SCRAPER_POOL = ThreadPoolExecutor(max_workers=MAX_SCRAPERS, thread_name_prefix="scraper")
+
+# Number extraction runs in worker processes so it doesn't hold the GIL
+# against the event loop and scrapers. "spawn" avoids forking a process
+# that already runs gRPC and writer threads. Workers only import extraction
+# as long as main.py is not itself __main__ (spawn re-runs the main script
+# in every worker), so start the app with the uvicorn CLI, e.g.
+#   uvicorn main:app --host 0.0.0.0 --port $PORT
+def new_proc_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+PROC_POOL = new_proc_pool()
+_proc_pool_lock = threading.Lock()
+
+# Firestore writes are queued by the scrapers and committed in batches
+# by a background writer, so the scrape loop never waits on network RTT.
+write_queue: queue.Queue = queue.Queue()
+# A WriteBatch holds at most 500 ops; each number adds one create plus at
+# most one lastUpdated merge for its uid, so 250 numbers always fit.
+WRITE_BATCH_SIZE = 250
+WRITE_FLUSH_INTERVAL = 1.0  # seconds a partial batch may wait for more numbers
+WRITE_MAX_PER_SEC = 10000
+WRITE_RETRIES = 3
+write_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="firestore-writer")
+
+LAST_UPDATED_INTERVAL = 5  # seconds between lastUpdated touches per session
+SSE_KEEPALIVE = 15  # seconds of silence before /stream sends a keepalive
+SSE_QUEUE_MAX = 1000  # numbers buffered per /stream client before it is dropped
+CHAT_WAIT = 1.0  # seconds a scraper blocks for the next pushed message
+CHAT_RESCAN_INTERVAL = 30  # seconds between full-scan safety nets
+SEEN_COMMENTS_MAX = 50000  # per-session cap on remembered message hashes
+
+# Installs window.__getChat (full scan bound to the chosen selector) and a
+# MutationObserver that pushes every added chat message into window.onChat.
+# Registered as an init script so both survive reloads and navigations;
+# the window flag keeps them from being installed twice in one document.
+_CHAT_HOOKS_JS = """
+(sel => {
+    if (window.__chatHooked) return;
+    window.__chatHooked = true;
+    window.__getChat = () => Array.from(document.querySelectorAll(sel), e => e.innerText);
+    new MutationObserver(muts => {
+        for (const m of muts) {
+            for (const n of m.addedNodes) {
+                if (n.nodeType !== 1) continue;
+                const hits = n.matches(sel) ? [n] : n.querySelectorAll(sel);
+                for (const h of hits) window.onChat(h.innerText);
+            }
+        }
+    }).observe(document, {childList: true, subtree: true});
+})(%s)
+"""
+
+# Verified ID tokens: blake2b(token) -> (uid, exp), most recently used last
+TOKEN_CACHE_SIZE = 4096
+_token_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+# Approved uids -> time they were last confirmed (TTL + snapshot invalidation)
+APPROVAL_TTL = 60
+approved_cache: Dict[str, float] = {}
+_approved_cache_lock = threading.Lock()
+
 # ============================================================
 # 📞 Helpers
 # ============================================================
 
-def extract_numbers(text: str) -> Set[str]:
-    """Extract valid Tunisian numbers."""
-    found = set()
+def publish_number(uid: str, data: FoundNumber):
+    """Record a found number and push it to every /stream subscriber."""
+    with _subscribers_lock:
+        sessions[uid].numbers.append(data)
+        for loop, q in subscribers.get(uid, ()):
+            loop.call_soon_threadsafe(offer_to_subscriber, q, data)
+
+
+def offer_to_subscriber(q: asyncio.Queue, data: FoundNumber):
+    """Queue a number for one /stream client (runs on its event loop).
 
+    A client that falls SSE_QUEUE_MAX numbers behind is disconnected with a
+    None sentinel; on reconnect it gets the session history replayed.
+    """
     try:
-        for match in phonenumbers.PhoneNumberMatcher(text, "TN"):
-            number = phonenumbers.format_number(match.number, phonenumbers.PhoneNumberFormat.E164)
-            digits_only = re.sub(r"\D", "", number)
-            if len(digits_only) == 8:
-                found.add(digits_only)
-    except Exception:
-        pass
+        q.put_nowait(data)
+    except asyncio.QueueFull:
+        q.get_nowait()
+        q.put_nowait(None)
+
+
+def extract_in_pool(texts: List[str]) -> List[Set[str]]:
+    """Run extract_many on PROC_POOL, rebuilding the pool if a worker died.
+
+    A killed worker (e.g. OOM) breaks the whole executor, so the broken
+    pool is replaced for later calls and this batch is extracted in-thread.
+    """
+    global PROC_POOL
+    pool = PROC_POOL
+    try:
+        return pool.submit(extract_many, texts).result()
+    except BrokenProcessPool:
+        with _proc_pool_lock:
+            if PROC_POOL is pool:
+                print("⚠️ Extraction pool broke, starting a new one")
+                PROC_POOL = new_proc_pool()
+        return extract_many(texts)
 
-    regex = re.compile(r"\b\d{8}\b")
-    for m in regex.findall(text):
-        found.add(m)
 
-    return found
+def sse_event(num: FoundNumber) -> str:
+    """Format a found number as a Server-Sent Event."""
+    payload = orjson.dumps({
+        "number": num.number,
+        "message": num.message,
+    }).decode()
+    return f"data: {payload}\n\n"
 
 
 def verify_token_get_uid_from_header(authorization_header: str) -> str:
@@ -88,42 +225,267 @@ def verify_token_get_uid_from_header(authorization_header: str) -> str:
 
 
 def verify_firebase_token(id_token: str) -> str:
-    """Verify Firebase token and return UID."""
+    """Verify Firebase token and return UID.
+
+    Successful verifications are cached until the token's ``exp`` so SSE
+    reconnects and repeated calls skip the signature check.
+    """
+    key = hashlib.blake2b(id_token.encode(), digest_size=16).hexdigest()
+    now = time.time()
+
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        if cached:
+            if cached[1] > now:
+                _token_cache.move_to_end(key)
+                return cached[0]
+            del _token_cache[key]
+
     try:
         decoded = firebase_auth.verify_id_token(id_token)
-        return decoded.get("uid")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired ID token")
 
+    uid = decoded.get("uid")
+    with _token_cache_lock:
+        _token_cache[key] = (uid, float(decoded.get("exp", 0)))
+        if len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return uid
+
+
+def is_approved(uid: str) -> bool:
+    """Return whether the user is approved, using the approval cache."""
+    with _approved_cache_lock:
+        confirmed_at = approved_cache.get(uid)
+    if confirmed_at and time.time() - confirmed_at < APPROVAL_TTL:
+        return True
+
+    user_doc = db.collection("users").document(uid).get()
+    if not user_doc.exists:
+        raise HTTPException(status_code=403, detail="User record not found")
+
+    if not user_doc.to_dict().get("approved", False):
+        with _approved_cache_lock:
+            approved_cache.pop(uid, None)
+        return False
+
+    with _approved_cache_lock:
+        approved_cache[uid] = time.time()
+    return True
+
+
+def on_approved_users_snapshot(docs, changes, read_time):
+    """Keep approved_cache in sync with the approved users query."""
+    now = time.time()
+    with _approved_cache_lock:
+        for change in changes:
+            if change.type.name == "REMOVED":
+                approved_cache.pop(change.document.id, None)
+            else:
+                approved_cache[change.document.id] = now
+
+# ============================================================
+# 💾 Firestore Writer
+# ============================================================
+
+def commit_numbers(items: List[PendingWrite]):
+    """Write a batch of queued numbers in one commit.
+
+    The parent extraction doc only gets a lastUpdated write for uids whose
+    scraper asked for it (``touch``), not once per number.
+    """
+    batch = db.batch()
+    touched: Set[str] = set()
+    for uid, num, text, touch in items:
+        doc_ref = db.collection("extractions").document(uid)
+        batch.create(doc_ref.collection("numbers").document(), {
+            "number": num,
+            "message": text,
+            "createdAt": firestore.SERVER_TIMESTAMP,
+        })
+        if touch:
+            touched.add(uid)
+    for uid in touched:
+        batch.set(
+            db.collection("extractions").document(uid),
+            {"lastUpdated": firestore.SERVER_TIMESTAMP},
+            merge=True,
+        )
+
+    for attempt in range(WRITE_RETRIES):
+        try:
+            batch.commit()
+            return
+        except AlreadyExists:
+            # A retried commit whose first attempt had already landed
+            return
+        except (Aborted, DeadlineExceeded):
+            time.sleep(0.5 * (2 ** attempt))
+        except Exception as e:
+            print("⚠️ Firestore write failed:", e)
+            return
+    print(f"⚠️ Firestore write failed after {WRITE_RETRIES} attempts ({len(items)} numbers dropped)")
+
+
+def firestore_writer():
+    """Drain write_queue into batches and hand them to the write pool.
+
+    A batch is flushed when it is full or WRITE_FLUSH_INTERVAL after its
+    first number, so a burst of numbers costs one commit, not one each.
+    """
+    while True:
+        items = [write_queue.get()]
+        deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+        while len(items) < WRITE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(write_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        write_pool.submit(commit_numbers, items)
+        # Keep the sustained rate under Firestore's recommended ceiling
+        time.sleep(len(items) / WRITE_MAX_PER_SEC)
+
+
+threading.Thread(target=firestore_writer, daemon=True).start()
+
+# ============================================================
+# 🌐 Shared Browser
+# ============================================================
+
+# One Chromium process serves every scraper. It is driven by async
+# Playwright on a single event-loop thread, so there is one Node driver and
+# no debugging port no matter how many sessions run; scraper threads hand
+# their Playwright calls to that loop with run_on_browser_loop(). With
+# several uvicorn workers each worker simply owns its own browser.
+BROWSER_RELAUNCH_DELAY = 5  # seconds to wait before relaunching Chromium
+_browser_loop = asyncio.new_event_loop()
+_browser: Optional[Browser] = None  # set while the browser is connected
+_browser_stopping = False
+
+
+def run_on_browser_loop(coro):
+    """Run a Playwright coroutine on the browser loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _browser_loop).result()
+
+
+async def host_browser():
+    """Keep the shared Chromium running until shutdown, relaunching on failure."""
+    global _browser
+    try:
+        async with async_playwright() as p:
+            while not _browser_stopping:
+                try:
+                    browser = await p.chromium.launch(
+                        headless=HEADLESS,
+                        args=["--disable-blink-features=AutomationControlled", "--no-sandbox"],
+                    )
+                except Exception as e:
+                    print(f"❌ Shared browser failed to launch: {e}")
+                else:
+                    disconnected = asyncio.Event()
+                    browser.on("disconnected", lambda _: disconnected.set())
+                    _browser = browser
+                    print("✅ Shared browser launched")
+                    await disconnected.wait()
+                    _browser = None
+
+                if not _browser_stopping:
+                    print(f"⚠️ Shared browser is down, relaunching in {BROWSER_RELAUNCH_DELAY}s")
+                    await asyncio.sleep(BROWSER_RELAUNCH_DELAY)
+    except Exception as e:
+        print(f"❌ Playwright driver failed, no shared browser: {e}")
+
+
+async def close_browser():
+    global _browser_stopping
+    _browser_stopping = True
+    if _browser is not None:
+        await _browser.close()
+
+
+def browser_available() -> bool:
+    """Whether the shared browser is up and can hand out contexts."""
+    browser = _browser
+    return browser is not None and browser.is_connected()
+
+
+@app.on_event("startup")
+def start_shared_browser():
+    threading.Thread(target=_browser_loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(host_browser(), _browser_loop)
+
+
+@app.on_event("startup")
+def watch_approved_users():
+    try:
+        db.collection("users").where("approved", "==", True).on_snapshot(on_approved_users_snapshot)
+    except Exception as e:
+        print("⚠️ Approved users listener failed, relying on TTL only:", e)
+
+
+@app.on_event("shutdown")
+def stop_shared_browser():
+    try:
+        run_on_browser_loop(close_browser())
+    except Exception as e:
+        print(f"⚠️ Closing shared browser failed: {e}")
+
+
+@app.on_event("shutdown")
+def stop_process_pool():
+    PROC_POOL.shutdown(wait=False, cancel_futures=True)
+
 # ============================================================
 # 🤖 Scraper Logic (Fixed and Updated)
 # ============================================================
 
+def wait_while_running(uid: str, seconds: float) -> bool:
+    """Sleep up to ``seconds``, returning early (False) once /stop is called."""
+    deadline = time.monotonic() + seconds
+    while sessions[uid].running:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(0.5, remaining))
+    return False
+
+
 def scraper_thread(uid: str, live_url: str):
     """Run TikTok live scraping for one user."""
-    seen_comments = set()
+    seen_comments: "OrderedDict[int, None]" = OrderedDict()  # LRU of text hashes
     seen_numbers = set()
+    doc_ref = db.collection("extractions").document(uid)
+    last_touch = 0.0
 
     print(f"🟢 Scraper thread starting for {uid} -> {live_url} (headless={HEADLESS})")
 
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=HEADLESS,
-                args=["--disable-blink-features=AutomationControlled", "--no-sandbox"],
+        # ✅ Each session gets its own context in the shared Chromium
+        browser = _browser
+        if browser is None:
+            raise RuntimeError("Shared browser is not available")
+
+        # ✅ Add realistic user-agent to avoid TikTok blocking
+        context = run_on_browser_loop(browser.new_context(
+            user_agent=(
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/120.0.0.0 Safari/537.36"
             )
-
-            # ✅ Add realistic user-agent to avoid TikTok blocking
-            context = browser.new_context(
-                user_agent=(
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/120.0.0.0 Safari/537.36"
-                )
-            )
-            page = context.new_page()
-            page.goto(live_url, timeout=60000)
-            time.sleep(8)
+        ))
+        try:
+            page = run_on_browser_loop(context.new_page())
+            run_on_browser_loop(page.goto(live_url, timeout=60000))
+
+            # ✅ Bail out of setup as soon as /stop is called so the
+            # session frees its slot instead of finishing page setup
+            if not wait_while_running(uid, 8):
+                print(f"🛑 Scraper for {uid} stopped during setup")
+                return
 
             print("⚠️ Waiting for TikTok chat messages to load...")
 
@@ -137,72 +499,116 @@ def scraper_thread(uid: str, live_url: str):
             ]
             chat_selector = None
             for sel in selectors:
+                if not sessions[uid].running:
+                    break
                 try:
-                    page.wait_for_selector(sel, timeout=8000)
+                    run_on_browser_loop(page.wait_for_selector(sel, timeout=8000))
                     chat_selector = sel
                     break
                 except Exception:
                     continue
 
+            if not sessions[uid].running:
+                print(f"🛑 Scraper for {uid} stopped during setup")
+                return
+
             if not chat_selector:
                 print("❌ No chat messages found after waiting.")
-                sessions[uid]["running"] = False
-                browser.close()
+                sessions[uid].running = False
                 return
 
             print(f"✅ Using chat selector: {chat_selector}")
 
-            sessions[uid]["running"] = True
-            sessions[uid].setdefault("numbers", [])
-
-            while sessions[uid]["running"]:
-                elements = page.query_selector_all(chat_selector)
-                for e in elements:
+            # ✅ liveUrl never changes during a session, so write it once
+            try:
+                doc_ref.set(
+                    {"liveUrl": live_url, "lastUpdated": firestore.SERVER_TIMESTAMP},
+                    merge=True,
+                )
+                last_touch = time.time()
+            except Exception as e:
+                print("⚠️ Firestore write failed:", e)
+
+            # ✅ New messages are pushed from the page instead of polled
+            incoming: queue.Queue = queue.Queue()
+            run_on_browser_loop(page.expose_function("onChat", incoming.put))
+            chat_hooks = _CHAT_HOOKS_JS % json.dumps(chat_selector)
+            run_on_browser_loop(page.add_init_script(chat_hooks))
+            run_on_browser_loop(page.evaluate(chat_hooks))
+            last_scan = 0.0
+
+            while sessions[uid].running:
+                texts = []
+                if time.time() - last_scan > CHAT_RESCAN_INTERVAL:
+                    # Full scan on start and as a periodic safety net
+                    try:
+                        texts = run_on_browser_loop(page.evaluate("() => window.__getChat()"))
+                    except Exception as e:
+                        # Hooks missing (e.g. mid-navigation); reinstall
+                        print(f"⚠️ Chat scan failed for {uid}, reinstalling hooks: {e}")
+                        try:
+                            run_on_browser_loop(page.evaluate(chat_hooks))
+                        except Exception as e:
+                            print(f"⚠️ Reinstalling chat hooks failed for {uid}: {e}")
+                    last_scan = time.time()
+
+                if not texts:
+                    # ✅ Block until the page pushes a message; onChat is
+                    # delivered on the browser loop, so nothing needs pumping
                     try:
-                        text = e.inner_text().strip()
-                    except Exception:
+                        texts.append(incoming.get(timeout=CHAT_WAIT))
+                    except queue.Empty:
                         continue
 
-                    if not text or text in seen_comments:
+                while True:
+                    try:
+                        texts.append(incoming.get_nowait())
+                    except queue.Empty:
+                        break
+
+                new_texts = []
+                for text in texts:
+                    text = (text or "").strip()
+                    if not text:
                         continue
-                    seen_comments.add(text)
-
-                    numbers_found = extract_numbers(text)
+                    key = hash(text)
+                    if key in seen_comments:
+                        seen_comments.move_to_end(key)
+                        continue
+                    seen_comments[key] = None
+                    if len(seen_comments) > SEEN_COMMENTS_MAX:
+                        seen_comments.popitem(last=False)
+                    if may_contain_number(text):
+                        new_texts.append(text)
+
+                # ✅ Extract the whole tick's messages in one pool call
+                results = extract_in_pool(new_texts) if new_texts else []
+                for text, numbers_found in zip(new_texts, results):
                     for num in numbers_found:
                         if num not in seen_numbers:
                             seen_numbers.add(num)
                             print(f"📞 Found: {num} → {text[:60]}")
 
-                            data = {
-                                "timestamp": firestore.SERVER_TIMESTAMP,
-                                "number": num,
-                                "message": text,
-                            }
-                            sessions[uid]["numbers"].append(data)
-
-                            # ✅ Firestore write
-                            try:
-                                doc_ref = db.collection("extractions").document(uid)
-                                db.collection("extractions").document(uid).collection("numbers").add({
-                                    "number": num,
-                                    "message": text,
-                                    "createdAt": firestore.SERVER_TIMESTAMP,
-                                })
-                                doc_ref.set(
-                                    {"liveUrl": live_url, "lastUpdated": firestore.SERVER_TIMESTAMP},
-                                    merge=True,
-                                )
-                            except Exception as e:
-                                print("⚠️ Firestore write failed:", e)
-
-                time.sleep(2)
+                            publish_number(uid, FoundNumber(num, text))
+
+                            # ✅ Firestore write (batched in the background)
+                            now = time.time()
+                            touch = now - last_touch > LAST_UPDATED_INTERVAL
+                            if touch:
+                                last_touch = now
+                            write_queue.put(PendingWrite(uid, num, text, touch))
 
             print(f"🔴 Scraper thread exiting for {uid}")
-            browser.close()
+        finally:
+            try:
+                run_on_browser_loop(context.close())
+            except Exception as e:
+                print(f"⚠️ Closing browser context failed for {uid}: {e}")
 
     except Exception as e:
-        sessions[uid]["running"] = False
-        sessions[uid].setdefault("error", str(e))
+        sessions[uid].running = False
+        if sessions[uid].error is None:
+            sessions[uid].error = str(e)
         print(f"❌ Scraper error for {uid}: {e}")
 
 # ============================================================
@@ -211,27 +617,31 @@ def scraper_thread(uid: str, live_url: str):
 
 @app.post("/start")
 async def start_scraping(request: Request):
-    uid = verify_token_get_uid_from_header(request.headers.get("authorization"))
+    uid = await asyncio.to_thread(verify_token_get_uid_from_header, request.headers.get("authorization"))
     payload = await request.json()
     live_url = payload.get("live_url")
 
     if not live_url:
         raise HTTPException(status_code=400, detail="Missing live_url")
 
-    user_doc = db.collection("users").document(uid).get()
-    if not user_doc.exists:
-        raise HTTPException(status_code=403, detail="User record not found")
-
-    user_data = user_doc.to_dict()
-    if not user_data.get("approved", False):
+    if not await asyncio.to_thread(is_approved, uid):
         raise HTTPException(status_code=403, detail="User not approved")
 
-    if uid in sessions and sessions[uid].get("running"):
+    if not browser_available():
+        raise HTTPException(status_code=503, detail="Browser is restarting, try again shortly")
+
+    # A session stays active through page setup and shutdown, not just while
+    # scraping, so it is never replaced while its job can still publish.
+    if uid in sessions and sessions[uid].is_active():
         return JSONResponse({"message": "Already running"}, status_code=400)
 
-    sessions[uid] = {"running": False, "numbers": []}
-    t = threading.Thread(target=scraper_thread, args=(uid, live_url), daemon=True)
-    t.start()
+    active = sum(1 for s in sessions.values() if s.is_active())
+    if active >= MAX_SCRAPERS:
+        raise HTTPException(status_code=429, detail="Too many active scrapers, try again later")
+
+    # running=True up front so a /stop during setup is not overridden
+    sessions[uid] = SessionState(running=True)
+    sessions[uid].future = SCRAPER_POOL.submit(scraper_thread, uid, live_url)
 
     print(f"✅ Scraper started for user: {uid}")
     return {"message": "Scraper started"}
@@ -239,9 +649,9 @@ async def start_scraping(request: Request):
 
 @app.post("/stop")
 async def stop_scraping(request: Request):
-    uid = verify_token_get_uid_from_header(request.headers.get("authorization"))
+    uid = await asyncio.to_thread(verify_token_get_uid_from_header, request.headers.get("authorization"))
     if uid in sessions:
-        sessions[uid]["running"] = False
+        sessions[uid].running = False
         print(f"🛑 Scraper stopped for user: {uid}")
         return {"message": "Scraper stopped"}
     return JSONResponse({"message": "No active session"}, status_code=404)
@@ -253,22 +663,38 @@ async def stream_numbers(request: Request):
     if not token:
         raise HTTPException(status_code=401, detail="Missing ?token param")
 
-    uid = verify_firebase_token(token)
-
-    def event_generator():
-        last_index = 0
-        while True:
-            if uid in sessions:
-                numbers = sessions[uid].get("numbers", [])
-                if len(numbers) > last_index:
-                    for num in numbers[last_index:]:
-                        payload = json.dumps({
-                            "number": num["number"],
-                            "message": num["message"],
-                        })
-                        yield f"data: {payload}\n\n"
-                    last_index = len(numbers)
-            time.sleep(1)
+    uid = await asyncio.to_thread(verify_firebase_token, token)
+
+    async def event_generator():
+        q: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_MAX)
+        sub = (asyncio.get_running_loop(), q)
+        with _subscribers_lock:
+            session = sessions.get(uid)
+            backlog = list(session.numbers) if session else []
+            subscribers.setdefault(uid, set()).add(sub)
+
+        try:
+            for num in backlog:
+                yield sse_event(num)
+
+            # ✅ The scraper pushes each number once; nothing is rescanned
+            while True:
+                try:
+                    num = await asyncio.wait_for(q.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if num is None:
+                    print(f"⚠️ Dropping slow /stream client for {uid}")
+                    return
+                yield sse_event(num)
+        finally:
+            with _subscribers_lock:
+                subs = subscribers.get(uid)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del subscribers[uid]
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -277,10 +703,3 @@ async def stream_numbers(request: Request):
 def root(request: Request):
     return {"message": "✅ Numify backend is running on Render"}
 
-
-if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 10000))
-    print(f"🚀 Starting server on port {port}")
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
-